@@ -0,0 +1,176 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+from comment_pattens import COMMENT_PATTERNS
+
+STATUS_OK = 'ok'
+STATUS_NON_UTF8 = 'non-utf-8'
+
+DEFAULT_MAX_SIZE_MB = 512
+
+
+def default_cache_dir():
+    """Return the per-user cache directory, honouring XDG_CACHE_HOME."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'repoharvester')
+
+
+class FileCache:
+    """Persistent, content-addressed cache of processed file bodies.
+
+    Entries are keyed by the SHA-256 of the raw file bytes, the file extension,
+    the comment pattern used for that extension and the processing options, so
+    editing COMMENT_PATTERNS or toggling comment removal never returns a stale
+    body. The store is an SQLite database in WAL mode, which lets several
+    harvests share one cache safely. New entries and ``last_used`` updates are
+    buffered and written in batches, so a run commits a handful of short
+    transactions rather than one per file. Least recently used entries are
+    evicted once the stored entries (body, key in table and index, and a
+    fixed per-row overhead) exceed ``max_size_mb``. SQLite reuses freed pages but never shrinks the
+    file, so the database stays at the largest size it has reached.
+
+    Any SQLite error after opening (a database locked past the timeout, a full
+    disk, a corrupted file) disables the cache for the rest of the run instead
+    of aborting the harvest.
+    """
+
+    FLUSH_ENTRIES = 500
+    FLUSH_BYTES = 8 * 1024 * 1024
+    ROW_OVERHEAD = 128  # Approximate bytes per row beyond key and body: other columns, b-tree cells, last_used index
+    TOUCH_INTERVAL = 3600  # Seconds; LRU order only needs coarse last_used times
+
+    def __init__(self, cache_dir=None, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_size = max_size_mb * 1024 * 1024
+        # Keep a single batch well below the cap so a flush can't overshoot it by much
+        self.flush_bytes = min(self.FLUSH_BYTES, self.max_size // 8)
+        self.hits = 0
+        self.misses = 0
+        self._pending = {}
+        self._pending_bytes = 0
+        self._touched = {}
+        self._pattern_versions = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, 'file_cache.sqlite3'), timeout=30)
+        try:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')  # A lost tail of cache entries is harmless
+            with self._conn:
+                self._conn.execute('CREATE TABLE IF NOT EXISTS entries ('
+                                   'key TEXT PRIMARY KEY, status TEXT NOT NULL, body BLOB, '
+                                   'size INTEGER NOT NULL, last_used REAL NOT NULL)')
+                self._conn.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+            self._total_size = self._stored_size()
+        except sqlite3.Error:
+            self._conn.close()
+            raise
+
+    def make_key(self, raw, file_extension, remove_comments):
+        """Build the cache key for a file's raw bytes and processing options."""
+        pattern_version = self._pattern_versions.get(file_extension)
+        if pattern_version is None:
+            pattern = COMMENT_PATTERNS.get(file_extension) or ''
+            pattern_version = hashlib.sha256(pattern.encode('utf-8')).hexdigest()[:16]
+            self._pattern_versions[file_extension] = pattern_version
+        content_hash = hashlib.sha256(raw).hexdigest()
+        return f'{content_hash}:{file_extension}:{pattern_version}:remove_comments={int(bool(remove_comments))}'
+
+    def get(self, key):
+        """Return ``(status, body)`` for a cached entry, or None on a miss."""
+        if key in self._pending:
+            self.hits += 1
+            status, data, _ = self._pending[key]
+            return status, data.decode('utf-8') if data is not None else None
+        if self._conn is None:
+            self.misses += 1
+            return None
+        try:
+            row = self._conn.execute('SELECT status, body, last_used FROM entries WHERE key = ?', (key,)).fetchone()
+        except sqlite3.Error as e:
+            self._disable(e)
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        status, body, last_used = row
+        now = time.time()
+        if now - last_used > self.TOUCH_INTERVAL:
+            self._touched[key] = now
+            if len(self._touched) >= self.FLUSH_ENTRIES:
+                self.flush()
+        return status, body.decode('utf-8') if body is not None else None
+
+    def put(self, key, status, body=None):
+        """Queue a processed body (or a decode failure) to be stored under ``key``."""
+        if self._conn is None:
+            return
+        data = body.encode('utf-8') if body is not None else None
+        self._pending[key] = (status, data, time.time())
+        self._pending_bytes += self._entry_size(key, data)
+        if len(self._pending) >= self.FLUSH_ENTRIES or self._pending_bytes >= self.flush_bytes:
+            self.flush()
+
+    def flush(self):
+        """Write queued entries and ``last_used`` updates in one transaction."""
+        if self._conn is None or not (self._pending or self._touched):
+            return
+        rows = [(key, status, data, self._entry_size(key, data), last_used)
+                for key, (status, data, last_used) in self._pending.items()]
+        touched = [(last_used, key) for key, last_used in self._touched.items()]
+        self._pending.clear()
+        self._pending_bytes = 0
+        self._touched.clear()
+        try:
+            with self._conn:
+                self._conn.executemany('INSERT OR REPLACE INTO entries (key, status, body, size, last_used) '
+                                       'VALUES (?, ?, ?, ?, ?)', rows)
+                self._conn.executemany('UPDATE entries SET last_used = ? WHERE key = ?', touched)
+            self._total_size += sum(row[3] for row in rows)
+            if self._total_size > self.max_size:
+                self._evict()
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def close(self):
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _disable(self, error):
+        """Stop using the cache for the rest of the run after an SQLite error."""
+        print(f'Warning: file cache disabled: {error}')
+        self._pending.clear()
+        self._pending_bytes = 0
+        self._touched.clear()
+        try:
+            self._conn.close()
+        except sqlite3.Error:
+            pass
+        self._conn = None
+
+    def _entry_size(self, key, data):
+        """Bytes charged against the size cap for one entry, including non-UTF-8 markers."""
+        # The key is stored twice: in the row and in the primary key index
+        return 2 * len(key) + (len(data) if data is not None else 0) + self.ROW_OVERHEAD
+
+    def _stored_size(self):
+        return self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under its size cap."""
+        with self._conn:
+            # Other harvests may have written to the cache, so recount before evicting
+            total = self._stored_size()
+            target = self.max_size * 0.9  # Leave some headroom so the next put doesn't evict again
+            stale = []
+            for key, size in self._conn.execute('SELECT key, size FROM entries ORDER BY last_used'):
+                if total <= target:
+                    break
+                stale.append((key,))
+                total -= size
+            self._conn.executemany('DELETE FROM entries WHERE key = ?', stale)
+        self._total_size = total
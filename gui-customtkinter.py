@@ -1,8 +1,9 @@
 import customtkinter as ctk
 from tkinter import filedialog  # For file dialog
+import queue
 import threading
 
-from repoharvester import RepoHarvester
+from repoharvester import RepoHarvester, CancelToken, HarvestCancelled
 
 
 class RepoHarvesterGUI:
@@ -10,12 +11,15 @@ class RepoHarvesterGUI:
         self.app = ctk.CTk()
         self.app.geometry("700x500")
         self.app.title("RepoHarvester")
+        self.cancel_token = None
+        self.events = queue.Queue()  # Filled by the worker thread, drained on the Tk thread
 
         # Configure theme and appearance (optional)
         ctk.set_appearance_mode("dark")  # Modes: system (default), light, dark
         ctk.set_default_color_theme("blue")  # Themes: blue (default), dark-blue, green
 
         self.create_widgets()
+        self.app.after(100, self.poll_events)
         self.app.mainloop()
 
     def create_widgets(self):
@@ -94,10 +98,18 @@ class RepoHarvesterGUI:
         # --- Action Buttons ---
         self.start_button = ctk.CTkButton(master=action_frame, text="Start", command=self.start_process)
         self.start_button.pack(side="left", padx=5)
+        self.cancel_button = ctk.CTkButton(master=action_frame, text="Cancel", command=self.cancel_process,
+                                           state="disabled")
+        self.cancel_button.pack(side="left", padx=5)
         clear_button = ctk.CTkButton(master=action_frame, text="Clear", command=self.clear_inputs)
         clear_button.pack(side="left", padx=5)
 
         # --- Status/Output Display ---
+        self.progress_bar = ctk.CTkProgressBar(master=status_frame)
+        self.progress_bar.set(0)
+        self.progress_bar.pack(fill="x", pady=5)
+        self.progress_label = ctk.CTkLabel(master=status_frame, text="")
+        self.progress_label.pack(fill="x")
         self.status_text = ctk.CTkTextbox(master=status_frame)
         self.status_text.pack(fill="both", expand=True)
 
@@ -133,6 +145,8 @@ class RepoHarvesterGUI:
 
         # Disable start button during processing
         self.start_button.configure(state="disabled") # Unresolved attribute reference 'start_button' for class 'RepoHarvesterGUI'
+        self.cancel_token = CancelToken()
+        self.cancel_button.configure(state="normal")
 
         # Create and start a thread for the harvesting process
         thread = threading.Thread(target=self.harvesting_thread, args=(repo_url, remove_comments,
@@ -141,13 +155,64 @@ class RepoHarvesterGUI:
         thread.start()
 
     def harvesting_thread(self, repo_url, remove_comments, excluded_extensions, max_size, exclude_folders, harvester):
+        # Widgets may only be touched from the Tk thread, so the worker only queues updates for poll_events()
         try:
-            harvester.run_from_gui(repo_url, remove_comments, excluded_extensions, max_size, exclude_folders)
-            self.status_text.insert("end", "Harvesting completed successfully!\n")
+            harvester.run_from_gui(repo_url, remove_comments, excluded_extensions, max_size, exclude_folders,
+                                   progress_callback=lambda event: self.events.put((self.show_progress, event)),
+                                   cancel_token=self.cancel_token)
+            self.events.put((self.log_status, "Harvesting completed successfully!\n"))
+        except HarvestCancelled:
+            self.events.put((self.log_status, "Harvesting cancelled.\n"))
         except Exception as e:
-            self.status_text.insert("end", f"An error occurred: {e}\n")
+            self.events.put((self.log_status, f"An error occurred: {e}\n"))
         finally:
-            self.start_button.configure(state="normal")  # Unresolved attribute reference 'start_button' for class 'RepoHarvesterGUI'
+            self.events.put((self.finish_process, None))
+
+    def poll_events(self):
+        while True:
+            try:
+                handler, arg = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if arg is None:
+                handler()
+            else:
+                handler(arg)
+        self.app.after(100, self.poll_events)
+
+    def cancel_process(self):
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+            self.cancel_button.configure(state="disabled")
+
+    def show_progress(self, event):
+        stage = event['stage']
+        if stage == 'clone':
+            total = event['clone_objects_total']
+            fraction = 0.3 * event['clone_objects_received'] / total if total else 0
+            text = f"Cloning: {event['clone_objects_received']}/{total} objects"
+        elif stage == 'walk':
+            fraction = 0.3
+            text = f"Walking: {event['files_walked']} files"
+        elif stage == 'write':
+            total = event['bytes_total']
+            fraction = 0.3 + 0.7 * event['bytes_read'] / total if total else 0.3
+            text = f"Writing: {event['bytes_read'] // 1024}/{total // 1024} KB read, " \
+                   f"{event['bytes_written'] // 1024} KB written"
+        else:
+            fraction = 1 if stage == 'done' else self.progress_bar.get()
+            text = stage.title()
+        self.progress_bar.set(fraction)
+        self.progress_label.configure(text=text)
+
+    def log_status(self, message):
+        self.status_text.insert("end", message)
+
+    def finish_process(self):
+        self.cancel_token = None
+        self.events = queue.Queue()  # Filled by the worker thread, drained on the Tk thread
+        self.cancel_button.configure(state="disabled")
+        self.start_button.configure(state="normal")  # Unresolved attribute reference 'start_button' for class 'RepoHarvesterGUI'
 
     def clear_inputs(self):
         # Implement input clearing logic here
@@ -1,7 +1,4 @@
-import getpass
 import os
-import shutil
-import subprocess
 
 from kivy.app import App
 from kivy.uix.gridlayout import GridLayout
@@ -18,53 +15,10 @@ import threading
 
 
 # (Import functions from repoharvester.py as needed)
-from repoharvester import get_repo_name, clone_repository, get_file_list, write_to_union_file, EXTENSION_GROUPS
-
-def clone_repository_with_password(repo_url, temp_dir):
-    # Run git clone command and capture output
-    process = subprocess.Popen(['git', 'clone', repo_url, temp_dir], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = process.communicate()
-    print(f'stdout.decode("utf-8"): {stdout.decode("utf-8")}')
-    print(f'stderr.decode("utf-8"): {stderr.decode("utf-8")}')
-
-    # If output contains password prompt
-    if b'passphrase' in stderr:
-        # Display Kivy popup to get password from user
-        password_popup = PasswordPopup(on_submit=clone_repository_with_password, repo_url=repo_url, temp_dir=temp_dir)
-        password_popup.open()
-
-        # Wait for user to enter password and close popup
-        while password_popup.is_open:
-            pass
-
-        # Get password entered by user
-        password = password_popup.password_input.text
-
-        # Run git clone command again with password
-        process = subprocess.Popen(['git', 'clone', repo_url, temp_dir], stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-        process.communicate(input=password.encode())
-class PasswordPopup(Popup):
-    password_input = ObjectProperty()
-
-    def __init__(self, on_submit, **kwargs):
-        super().__init__(**kwargs)
-        self.on_submit = on_submit
-        self.title = "Enter Password"
-        self.size_hint = (0.5, 0.3)
-        self.auto_dismiss = False
-
-        layout = BoxLayout(orientation='vertical')
-        layout.add_widget(Label(text="Password:"))
-        self.password_input = TextInput(password=True)
-        layout.add_widget(self.password_input)
-        submit_button = Button(text="Submit", on_press=self._submit)
-        layout.add_widget(submit_button)
-        self.content = layout
-
-    def _submit(self, instance):
-        password = self.password_input.text
-        self.on_submit(password)
-        self.dismiss()
+from repoharvester import RepoHarvester, CancelToken, HarvestCancelled
+
+EXTENSION_GROUPS = RepoHarvester().EXTENSION_GROUPS
+
 
 class RepoHarvesterApp(App):
     repo_url_input = ObjectProperty()
@@ -114,9 +68,11 @@ class RepoHarvesterApp(App):
 
         # Action Buttons
         button_layout = BoxLayout(orientation='horizontal', size_hint_y=0.2)
-        harvest_button = Button(text="Harvest", on_press=self.start_harvest)
+        self.harvest_button = Button(text="Harvest", on_press=self.start_harvest)
+        self.cancel_button = Button(text="Cancel", on_press=self.cancel_harvest, disabled=True)
         clear_button = Button(text="Clear", on_press=self.clear_inputs)
-        button_layout.add_widget(harvest_button)
+        button_layout.add_widget(self.harvest_button)
+        button_layout.add_widget(self.cancel_button)
         button_layout.add_widget(clear_button)
 
         # Add buttons to main layout
@@ -147,44 +103,52 @@ class RepoHarvesterApp(App):
         # ...
         return excluded_extensions
 
-    def harvest_repo(self, repo_url, remove_comments, excluded_extensions):
-        # 1. Get repo name and create temp directory
-        repo_name = get_repo_name(repo_url)
-        temp_dir = f'tmp_{repo_name}'
-
-        # 2. Update progress and clone repository
-        self.update_progress(10, "Cloning repository...")
-
-        clone_repository_with_password(repo_url, temp_dir)
-        # while True:
-        #     try:
-        #         clone_repository(repo_url, temp_dir)
-        #         break  # Successful clone, exit loop
-        #     except Exception as e:
-        #         print(f"Error: {e}")
-        #         password = getpass.getpass(prompt="Enter password: ")
-        #         self.repo_url_input.password = password
-        # clone_repository(repo_url, temp_dir)
-
-
-        # 3. Get file list
-        self.update_progress(30, "Getting file list...")
+    def harvest_repo(self, repo_url, remove_comments, excluded_extensions, cancel_token):
         max_size = 1000  # Replace with value from user input
         excluded_folders = []  # Replace with value from user input
-        file_list = get_file_list(temp_dir, excluded_extensions, max_size, excluded_folders)
-
-        # 4. Write to union file
-        self.update_progress(60, "Writing to file...")
         log_file = "output/union_file.log"  # Replace with value from user input
-        union_filename = write_to_union_file(file_list, repo_name, remove_comments, log_file)
 
-        # 5. Update progress and clean up
-        self.update_progress(90, "Cleaning up...")
-        shutil.rmtree(temp_dir)
+        # Progress events arrive on this worker thread; widgets are updated on the Kivy main thread
+        def on_progress(event):
+            Clock.schedule_once(lambda dt: self.show_progress(event))
 
-        # 6. Display results
-        self.update_progress(100, "Done!")
-        Clock.schedule_once(lambda dt: self.show_results_popup(union_filename), 1)
+        try:
+            union_filename = RepoHarvester().run_from_gui(repo_url, remove_comments, excluded_extensions, max_size,
+                                                          excluded_folders, log_file, on_progress, cancel_token)
+        except HarvestCancelled:
+            Clock.schedule_once(lambda dt: self.update_progress(0, "Cancelled"))
+        except Exception as e:
+            message = f"Error: {e}"
+            Clock.schedule_once(lambda dt: self.show_error_popup(message))
+        else:
+            Clock.schedule_once(lambda dt: self.show_results_popup(union_filename), 1)
+        finally:
+            Clock.schedule_once(lambda dt: self.finish_harvest())
+
+    def finish_harvest(self):
+        self.cancel_button.disabled = True
+        self.harvest_button.disabled = False
+
+    def show_progress(self, event):
+        stage = event['stage']
+        if stage == 'clone':
+            total = event['clone_objects_total']
+            value = 30 * event['clone_objects_received'] / total if total else 0
+            message = f"Cloning repository... {event['clone_objects_received']}/{total} objects"
+        elif stage == 'walk':
+            value = 30
+            message = f"Getting file list... {event['files_walked']} files"
+        elif stage == 'write':
+            total = event['bytes_total']
+            value = 30 + 70 * event['bytes_read'] / total if total else 30
+            message = f"Writing to file... {event['bytes_read'] // 1024}/{total // 1024} KB"
+        elif stage == 'done':
+            value = 100
+            message = "Done!"
+        else:
+            value = self.progress_bar.value
+            message = "Cleaning up..."
+        self.update_progress(value, message)
 
     def show_results_popup(self, filename):
         content = BoxLayout(orientation='vertical')
@@ -232,9 +196,17 @@ class RepoHarvesterApp(App):
         excluded_extensions = self.build_excluded_extensions_set()
 
         # Start harvesting in a separate thread
-        thread = threading.Thread(target=self.harvest_repo, args=(repo_url, remove_comments, excluded_extensions))
+        self.cancel_token = CancelToken()
+        self.harvest_button.disabled = True
+        self.cancel_button.disabled = False
+        thread = threading.Thread(target=self.harvest_repo,
+                                  args=(repo_url, remove_comments, excluded_extensions, self.cancel_token))
         thread.start()
 
+    def cancel_harvest(self, instance):
+        self.cancel_token.cancel()
+        self.cancel_button.disabled = True
+
     def clear_inputs(self, instance):
         self.repo_url_input.text = ""
         self.remove_comments_check.active = False
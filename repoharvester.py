@@ -3,9 +3,127 @@ import logging
 import os
 import re
 import shutil
+import signal
+import sqlite3
 import subprocess
+import sys
+import threading
+import time
 
 from comment_pattens import COMMENT_PATTERNS
+from file_cache import DEFAULT_MAX_SIZE_MB, STATUS_NON_UTF8, STATUS_OK, FileCache
+
+CLONE_PROGRESS_PATTERN = re.compile(r'Receiving objects:\s+\d+% \((\d+)/(\d+)\)')
+
+
+class HarvestCancelled(Exception):
+    """Raised when a harvest is stopped through its CancelToken."""
+
+
+class GitCloneError(subprocess.CalledProcessError):
+    """Raised when ``git clone`` fails; the message includes git's own output."""
+
+    def __str__(self):
+        message = super().__str__()
+        if self.stderr:
+            message += f'\n{self.stderr}'
+        return message
+
+
+class CancelToken:
+    """Thread-safe flag used to ask a running harvest to stop."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise HarvestCancelled('Harvest cancelled')
+
+
+class ProgressReporter:
+    """Collect progress counters and pass coalesced snapshots to a callback.
+
+    Updates arriving faster than ``min_interval`` seconds are merged into the
+    next snapshot, so a GUI event loop receives at most one event per interval
+    no matter how many files are processed. The callback is invoked from the
+    harvesting thread and receives a plain dict. If the callback raises (for
+    example because the GUI window was closed) a warning is printed and no
+    further events are sent, so a broken front end cannot interrupt a harvest.
+    """
+
+    def __init__(self, callback=None, min_interval=0.1):
+        self.callback = callback
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_emit = 0.0
+        self._state = {
+            'stage': None,
+            'clone_objects_received': 0,
+            'clone_objects_total': 0,
+            'files_walked': 0,
+            'bytes_total': 0,
+            'bytes_read': 0,
+            'bytes_written': 0,
+        }
+
+    def set_stage(self, stage):
+        """Switch to a new stage; stage changes are always emitted."""
+        with self._lock:
+            self._state['stage'] = stage
+        self.flush()
+
+    def update(self, **values):
+        """Overwrite counters with the given absolute values."""
+        with self._lock:
+            self._state.update(values)
+        self._maybe_emit()
+
+    def advance(self, **increments):
+        """Add the given amounts to the current counters."""
+        with self._lock:
+            for key, amount in increments.items():
+                self._state[key] += amount
+        self._maybe_emit()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._state)
+
+    def flush(self):
+        """Emit the current state regardless of the rate limit."""
+        if self.callback is None:
+            return
+        with self._lock:
+            self._last_emit = time.monotonic()
+            event = dict(self._state)
+        self._emit(event)
+
+    def _maybe_emit(self):
+        if self.callback is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_emit < self.min_interval:
+                return
+            self._last_emit = now
+            event = dict(self._state)
+        self._emit(event)
+
+    def _emit(self, event):
+        try:
+            self.callback(event)
+        except Exception as e:
+            print(f'Warning: progress callback failed, further progress events dropped: {e!r}')
+            self.callback = None
+
 
 class RepoHarvester:
     def __init__(self):
@@ -36,25 +154,124 @@ class RepoHarvester:
         return repo_url.strip().split('/')[-1].replace('.git', '')
 
 
-    def _clone_repository(self, repo_url, temp_dir):
-        """Clone the repository into a temporary directory."""
-        subprocess.run(['git', 'clone', repo_url, temp_dir], check=True)
+    def _clone_repository(self, repo_url, temp_dir, progress=None, cancel_token=None, echo=False):
+        """Clone the repository into a temporary directory.
+
+        git's ``--progress`` output is parsed to report received objects. With
+        ``echo`` git's output is also passed through to stderr, as a plain
+        ``git clone`` would show it.
+
+        When a cancel token is given, git runs in its own session so that
+        cancelling can signal its helpers (``git-remote-https``,
+        ``index-pack``, ``ssh``) as well. Without one git keeps the controlling
+        terminal, so ssh can still prompt for a passphrase.
+        """
+        progress = progress or ProgressReporter()
+        cancellable = cancel_token is not None
+        cancel_token = cancel_token or CancelToken()
+        cancel_token.raise_if_cancelled()
+
+        args = ['git', 'clone', repo_url, temp_dir]
+        if progress.callback is not None or (echo and sys.stderr.isatty()):
+            args.insert(2, '--progress')
+        process = subprocess.Popen(args, stdout=None if echo else subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                   start_new_session=cancellable and os.name == 'posix')
+        messages = []
+        reader = threading.Thread(target=self._read_clone_progress,
+                                  args=(process.stderr, progress, messages, echo), daemon=True)
+        reader.start()
+        try:
+            while True:
+                try:
+                    process.wait(timeout=0.1)
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancel_token.is_cancelled:
+                        self._terminate_clone(process, own_group=cancellable and os.name == 'posix')
+                        cancel_token.raise_if_cancelled()
+        finally:
+            reader.join(timeout=5)
+            # The reader holds the stream's lock inside read1(); closing it now would block until EOF
+            if not reader.is_alive():
+                process.stderr.close()
+
+        if process.returncode != 0:
+            raise GitCloneError(process.returncode, args, stderr='\n'.join(messages))
+
+    def _terminate_clone(self, process, own_group):
+        """Stop git, and with ``own_group`` every helper process it started."""
+        if own_group:
+            self._signal_group(process, signal.SIGTERM)
+        else:
+            process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            if own_group:
+                self._signal_group(process, signal.SIGKILL)
+            else:
+                process.kill()
+            process.wait()
+        if own_group:
+            # Helpers may outlive git itself; make sure none keep writing into the clone
+            self._signal_group(process, signal.SIGKILL)
+
+    def _signal_group(self, process, sig):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _read_clone_progress(self, stream, progress, messages, echo=False):
+        """Parse git's carriage-return separated progress lines from stderr."""
+        buffer = b''
+        while True:
+            chunk = stream.read1(4096)
+            if not chunk:
+                break
+            buffer += chunk
+            *parts, buffer = re.split(rb'([\r\n])', buffer)
+            # parts alternates between line contents and the separator that ended them
+            for line, separator in zip(parts[::2], parts[1::2]):
+                self._handle_clone_line(line.decode('utf-8', errors='replace'), progress, messages,
+                                        separator.decode() if echo else None)
+        if buffer:
+            self._handle_clone_line(buffer.decode('utf-8', errors='replace'), progress, messages,
+                                    '' if echo else None)
+
+    def _handle_clone_line(self, line, progress, messages, echo_separator=None):
+        if echo_separator is not None:
+            sys.stderr.write(line + echo_separator)
+            sys.stderr.flush()
+        match = CLONE_PROGRESS_PATTERN.search(line)
+        if match:
+            progress.update(clone_objects_received=int(match.group(1)),
+                            clone_objects_total=int(match.group(2)))
+        elif line.strip() and '%' not in line:
+            messages.append(line.strip())
 
-    def _get_file_list(self, temp_dir, excluded_extensions, max_size, excluded_folders):
+    def _get_file_list(self, temp_dir, excluded_extensions, max_size, excluded_folders,
+                       progress=None, cancel_token=None):
         """Walk the directory tree to get the list of files excluding certain extensions, .git, and .github directories."""
+        progress = progress or ProgressReporter()
+        cancel_token = cancel_token or CancelToken()
         file_list = []
         for root, dirs, files in os.walk(temp_dir, topdown=True):
             dirs[:] = [d for d in dirs if d not in {'.git', '.github'} and d not in excluded_folders]  # Skip the .git and .github directories
             for file in files:
+                cancel_token.raise_if_cancelled()
+                progress.advance(files_walked=1)
                 if file.split('.')[-1] not in excluded_extensions:
                     file_path = os.path.join(root, file)
-                    file_size_kb = os.path.getsize(file_path) / 1024
+                    file_size = os.path.getsize(file_path)
+                    file_size_kb = file_size / 1024
                     if file_size_kb > max_size:
                         print(f"Skipping file larger than {max_size} KB: {file}, size: {file_size_kb} KB")
                         continue
                     elif file_size_kb > 500:
                         print(f"File larger than 500 KB: {file}, size: {file_size_kb} KB")
                     file_list.append(os.path.join(root, file))
+                    progress.advance(bytes_total=file_size)
         return file_list
 
     def _remove_comments(self, content, file_extension):
@@ -64,40 +281,89 @@ class RepoHarvester:
             content = re.sub(pattern, '', content, flags=re.MULTILINE)
         return content
 
-    def _write_to_union_file(self, file_list, repo_name, remove_comments_flag, log_file):
+    def _read_processed(self, file_path, file_extension, remove_comments_flag, cache=None):
+        """Return ``(body, bytes_read)`` for a file; body is None if it is not valid UTF-8."""
+        with open(file_path, 'rb') as file:
+            raw = file.read()
+        bytes_read = len(raw)
+
+        # Only comment removal is worth caching; a plain decode is cheaper than hashing and a lookup
+        if not (remove_comments_flag and COMMENT_PATTERNS.get(file_extension)):
+            cache = None
+        key = None
+        if cache is not None:
+            key = cache.make_key(raw, file_extension, remove_comments_flag)
+            cached = cache.get(key)
+            if cached is not None:
+                status, body = cached
+                return (body if status == STATUS_OK else None), bytes_read
+
+        try:
+            content = raw.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')  # Same newlines as text mode
+        except UnicodeDecodeError:
+            if cache is not None:
+                cache.put(key, STATUS_NON_UTF8)
+            return None, bytes_read
+
+        if remove_comments_flag:
+            content = self._remove_comments(content, file_extension)
+        if cache is not None:
+            cache.put(key, STATUS_OK, content)
+        return content, bytes_read
+
+    def _open_cache(self, cache_dir=None, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        """Open the processed-file cache, falling back to no cache if it is unusable."""
+        try:
+            return FileCache(cache_dir, max_size_mb)
+        except (OSError, sqlite3.Error) as e:
+            print(f'Warning: file cache disabled: {e}')
+            return None
+
+    def _write_to_union_file(self, file_list, repo_name, remove_comments_flag, log_file,
+                             progress=None, cancel_token=None, cache=None):
+        progress = progress or ProgressReporter()
+        cancel_token = cancel_token or CancelToken()
         output_dir = 'output'
         skipped_files = f'{output_dir}/skipped_files.txt'
         os.makedirs(output_dir, exist_ok=True)
         union_filename = f'{output_dir}/{repo_name}_all_files.txt'
 
-        with open(union_filename, 'w', encoding='utf-8') as union_file, \
-             open(skipped_files, 'w', encoding='utf-8') as skipped_file:
-
-            union_file.write(f'## {repo_name}\n')
-
-            for file_path in file_list:
-                filename = os.path.basename(file_path)
-                file_extension = filename.split('.')[-1]
-                file_size = os.path.getsize(file_path) / 1024  # Calculate file size in KB
-
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        content = file.read()
+        try:
+            # Binary mode so each body is encoded once and the written byte count is exact
+            with open(union_filename, 'wb') as union_file, \
+                 open(skipped_files, 'w', encoding='utf-8') as skipped_file:
 
-                        if remove_comments_flag:
-                            content = self._remove_comments(content, file_extension)
+                self._write_counted(union_file, f'## {repo_name}\n', progress)
 
-                        union_file.write(f'### {filename}\n')
-                        union_file.write(content)
-                        union_file.write('\n### end of file\n')
+                for file_path in file_list:
+                    cancel_token.raise_if_cancelled()
+                    filename = os.path.basename(file_path)
+                    file_extension = filename.split('.')[-1]
+                    content, file_bytes = self._read_processed(file_path, file_extension, remove_comments_flag, cache)
+                    file_size = file_bytes / 1024  # Calculate file size in KB
+                    if content is None:
+                        print(f"Skipping non-UTF-8 file: {filename}")  # Log skipped file
+                        skipped_file.write(f"{filename}\n")  # Write skipped file name to file
+                    else:
+                        self._write_counted(union_file, f'### {filename}\n', progress)
+                        self._write_counted(union_file, content, progress)
+                        self._write_counted(union_file, '\n### end of file\n', progress)
 
                         logging.info(f"{filename}, size: {file_size:.2f} KB")
-                except UnicodeDecodeError:
-                    print(f"Skipping non-UTF-8 file: {filename}")  # Log skipped file
-                    skipped_file.write(f"{filename}\n")  # Write skipped file name to file
+                    progress.advance(bytes_read=file_bytes)
+        except HarvestCancelled:
+            os.remove(union_filename)  # Don't leave a partial union file behind
+            raise
 
+        progress.flush()
         return union_filename
 
+    def _write_counted(self, union_file, text, progress):
+        """Write text to the union file and report the number of bytes written."""
+        data = text.encode('utf-8')
+        union_file.write(data)
+        progress.advance(bytes_written=len(data))
+
     def run_from_command_line(self):
         parser = argparse.ArgumentParser(description='Clone a repo and compile its contents into a single file.')
         parser.add_argument('repo_url', type=str, help='GitHub repository URL (SSH)')
@@ -106,6 +372,12 @@ class RepoHarvester:
         parser.add_argument('--max-size', type=int, default=1000, help='Maximum file size in KB')
         parser.add_argument('--log', type=str, default='output/union_file.log', help='Path to log file')
         parser.add_argument('--exclude', nargs='+', default=[], help='Exclude these folders (and their contents)')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Do not use the processed-file cache (only used with --remove)')
+        parser.add_argument('--cache-dir', type=str, default=None, help='Directory of the processed-file cache')
+        parser.add_argument('--cache-max-size', type=int, default=DEFAULT_MAX_SIZE_MB,
+                            help='Maximum size of the processed-file cache in MB '
+                                 '(the database file does not shrink after eviction)')
         args = parser.parse_args()
 
         # Configure logging
@@ -123,35 +395,64 @@ class RepoHarvester:
                 if group in self.EXTENSION_GROUPS:
                     excluded_extensions -= self.EXTENSION_GROUPS[group]
 
-        repo_name = self._get_repo_name(args.repo_url)
+        # Only comment removal is cached, so don't touch the cache database otherwise
+        use_cache = args.remove and not args.no_cache
+        cache = self._open_cache(args.cache_dir, args.cache_max_size) if use_cache else None
+        try:
+            self._harvest(args.repo_url, args.remove, excluded_extensions, args.max_size, args.exclude, args.log,
+                          cache=cache, echo=True)
+        finally:
+            if cache is not None:
+                cache.close()
+
+    def run_from_gui(self, repo_url, remove_comments, excluded_extensions, max_size, exclude_folders,
+                     log_file_path='output/union_file.log', progress_callback=None, cancel_token=None,
+                     use_cache=True):
+        """Run a harvest for a GUI front end.
+
+        ``progress_callback`` receives rate-limited progress dicts from the
+        worker thread; GUIs must hand them over to their own event loop.
+        ``cancel_token`` can be triggered from any thread to stop the run.
+        """
+        # Configure logging
+        logging.basicConfig(filename=log_file_path, level=logging.INFO, format='%(message)s')
+
+        cache = self._open_cache() if use_cache and remove_comments else None
+        try:
+            return self._harvest(repo_url, remove_comments, excluded_extensions, max_size, exclude_folders,
+                                 log_file_path, ProgressReporter(progress_callback), cancel_token, cache)
+        finally:
+            if cache is not None:
+                cache.close()
+
+    def _harvest(self, repo_url, remove_comments, excluded_extensions, max_size, exclude_folders, log_file,
+                 progress=None, cancel_token=None, cache=None, echo=False):
+        """Clone, walk and compile a repository, always removing the temporary clone."""
+        progress = progress or ProgressReporter()
+        repo_name = self._get_repo_name(repo_url)
         temp_dir = f'tmp_{repo_name}'
         try:
-            self._clone_repository(args.repo_url, temp_dir)
-            file_list = self._get_file_list(temp_dir, excluded_extensions, args.max_size, args.exclude)
-            union_filename = self._write_to_union_file(file_list, repo_name, args.remove, args.log)
+            progress.set_stage('clone')
+            self._clone_repository(repo_url, temp_dir, progress, cancel_token, echo)
+            progress.set_stage('walk')
+            file_list = self._get_file_list(temp_dir, excluded_extensions, max_size, exclude_folders,
+                                            progress, cancel_token)
+            progress.set_stage('write')
+            union_filename = self._write_to_union_file(file_list, repo_name, remove_comments, log_file,
+                                                       progress, cancel_token, cache)
             print(f'All files have been written to {union_filename}')
+            if cache is not None:
+                print(f'File cache: {cache.hits} hits, {cache.misses} misses')
+                logging.info(f"File cache: {cache.hits} hits, {cache.misses} misses")
         finally:
-            try:
-                shutil.rmtree(temp_dir)
-            except OSError as e:
-                print(f'Error: {e.strerror} - {e.filename}')
-
-    def run_from_gui(self, repo_url, remove_comments, excluded_extensions, max_size, exclude_folders, log_file_path='output/union_file.log'):
-            # Configure logging
-            logging.basicConfig(filename=log_file_path, level=logging.INFO, format='%(message)s')
-
-            repo_name = self._get_repo_name(repo_url)
-            temp_dir = f'tmp_{repo_name}'
-            try:
-                self._clone_repository(repo_url, temp_dir)
-                file_list = self._get_file_list(temp_dir, excluded_extensions, max_size, exclude_folders)
-                union_filename = self._write_to_union_file(file_list, repo_name, remove_comments, log_file_path)
-                print(f'All files have been written to {union_filename}')
-            finally:
+            if os.path.exists(temp_dir):
                 try:
                     shutil.rmtree(temp_dir)
                 except OSError as e:
                     print(f'Error: {e.strerror} - {e.filename}')
+            progress.set_stage('cleanup')
+        progress.set_stage('done')
+        return union_filename
 
 
 if __name__ == '__main__':